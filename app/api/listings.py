@@ -1,16 +1,23 @@
-import json
 import logging
 from collections import defaultdict
+from collections.abc import Iterable
+from itertools import chain
+from operator import attrgetter
 from typing import Annotated
 
-from fastapi import APIRouter, Query
+import orjson
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, TypeAdapter
-from sqlalchemy import Select, and_, func
+from sqlalchemy import Integer, Select, String, any_, cast, exists, false, func, literal
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import selectinload
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.api.utils import is_bool_like
-from app.database import get_db_session
+from app.api.utils import decode_cursor, encode_cursor, is_bool_like
+from app.database import get_async_session, get_read_only_async_session
 from app.models import (
     BooleanPropertyValue,
     DatasetEntity,
@@ -20,123 +27,125 @@ from app.models import (
     StringPropertyValue,
 )
 from app.schemas.request import (
-    Entity,
     ListingGetRequest,
     UpsertListing,
     UpsertListingsRequest,
 )
-from app.schemas.response import ListingGet, ListingsGetResponse, UpsertListingsResponse
+from app.schemas.response import (
+    ListingGet,
+    ListingGetEntity,
+    ListingGetProperty,
+    ListingsGetResponse,
+    UpsertListingsResponse,
+)
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/listings", tags=["listings"])
 
 
+PAGE_SIZE = 100
+
+_BOOL_ADAPTER = TypeAdapter(bool)
+
+
 class PropertyValueLike(BaseModel):
     name: str
     type: str
     value: str
 
 
-@router.get("/", response_model=ListingsGetResponse)
-def get_listings(filters: Annotated[ListingGetRequest, Query()]):
-    """Get all listings with optional filters."""
-    logger.info(f"GET /listings/ - Filters: {filters}")
-    PAGE_SIZE = 100
-
-    with get_db_session() as session:
-        statement = (
-            select(
-                Listing,
-                func.coalesce(
-                    func.json_agg(
-                        func.json_build_object(
-                            "name", DatasetEntity.name, "data", DatasetEntity.data
-                        )
-                    ),
-                    func.json_build_array(),
-                ).label("entities"),
-            )
-            .options(
-                selectinload(Listing.string_property_values).selectinload(
-                    StringPropertyValue.property
-                ),
-                selectinload(Listing.boolean_property_values).selectinload(
-                    BooleanPropertyValue.property
-                ),
-            )
-            .join(
-                DatasetEntity, Listing.dataset_entity_ids.any(DatasetEntity.entity_id)
-            )
-            .filter(DatasetEntity.name.is_not(None))
-            .group_by(Listing.listing_id)
-        )
+_PROPERTY_TABLE_MAP = {
+    PropertyType.STRING: StringPropertyValue,
+    PropertyType.BOOLEAN: BooleanPropertyValue,
+}
+
+_FORMATTER = {
+    StringPropertyValue: attrgetter("value"),
+    BooleanPropertyValue: lambda x: x.value.lower() == "true",
+}
+
+
+# Built once, requests only append their filters
+_BASE_LISTINGS_STATEMENT = (
+    select(Listing)
+    .options(
+        # Join the many-to-one Property into each value query
+        selectinload(Listing.string_property_values).joinedload(
+            StringPropertyValue.property, innerjoin=True
+        ),
+        selectinload(Listing.boolean_property_values).joinedload(
+            BooleanPropertyValue.property, innerjoin=True
+        ),
+    )
+    .order_by(Listing.listing_id)
+    .limit(PAGE_SIZE)
+)
 
-        if filters.dataset_entities:
-            statement = statement.where(
-                and_(
-                    func.cardinality(Listing.dataset_entity_ids) > 0,
-                    DatasetEntity.data.op("@>")(json.loads(filters.dataset_entities)),
-                )
-            )
+# Count over the bare listing table, only the filters are shared with the
+# page query, none of the eager loading
+_BASE_COUNT_STATEMENT = select(func.count()).select_from(Listing)
 
-        has_property_filters, listing_ids = _get_property_filtered_ids(
-            filters.properties, session, filters.listing_id
-        )
-        if has_property_filters:
-            # If property filters found no match, return empty response
-            if not listing_ids:
-                return ListingsGetResponse(listings=[], total=0)
 
-            statement = statement.where(Listing.listing_id.in_(listing_ids))
+@router.get("/", response_model=ListingsGetResponse)
+async def get_listings(
+    filters: Annotated[ListingGetRequest, Query()],
+    session: Annotated[AsyncSession, Depends(get_read_only_async_session)],
+):
+    """Get all listings with optional filters."""
+    logger.info("GET /listings/ - Filters: %s", filters)
 
-        statement = _add_filters(statement, filters)
+    statement = _BASE_LISTINGS_STATEMENT
 
-        total_count = _get_count(session, filters)
+    property_filters = await _get_property_filters(filters.properties, session)
+    statement = _add_property_filters(statement, property_filters)
 
-        if filters.page:
-            statement = statement.offset((filters.page - 1) * PAGE_SIZE)
+    statement = _add_filters(statement, filters)
 
-        statement = statement.order_by(Listing.listing_id).limit(PAGE_SIZE)
-        results = session.exec(statement).all()
+    total_count = None
+    if filters.include_total:
+        total_count = await _get_count(session, filters, property_filters)
 
-        formatted_results = _get_formatted_results(results)
+    # Keyset pagination, resume right after the last listing of the
+    # previous page instead of scanning and discarding an OFFSET
+    if filters.cursor:
+        last_listing_id = decode_cursor(filters.cursor)
+        statement = statement.where(Listing.listing_id > last_listing_id)
 
-        return ListingsGetResponse(
-            listings=formatted_results,
-            total=total_count,
-        )
+    results = (await session.exec(statement)).all()
 
+    next_cursor = None
+    if len(results) == PAGE_SIZE:
+        next_cursor = encode_cursor(results[-1].listing_id)
 
-def _get_count(session: Session, filters: ListingGetRequest) -> int:
-    # Create a separate count query without json_agg to avoid duplicates
-    count_statement = (
-        select(func.count(Listing.listing_id.distinct()))
-        .join(DatasetEntity, Listing.dataset_entity_ids.any(DatasetEntity.entity_id))
-        .filter(DatasetEntity.name.is_not(None))
-    )
+    entities = await _get_entities(results, session)
+    formatted_results = _get_formatted_results(results, entities)
 
-    if filters.dataset_entities:
-        count_statement = count_statement.where(
-            and_(
-                func.cardinality(Listing.dataset_entity_ids) > 0,
-                DatasetEntity.data.op("@>")(json.loads(filters.dataset_entities)),
-            )
-        )
-
-    has_property_filters, listing_ids = _get_property_filtered_ids(
-        filters.properties, session
+    response = ListingsGetResponse.model_construct(
+        listings=formatted_results,
+        total=total_count,
+        next_cursor=next_cursor,
     )
-    if has_property_filters:
-        # The no-match case should ideally not reach here
-        count_statement = count_statement.where(Listing.listing_id.in_(listing_ids))
+    # Returned as a response so FastAPI doesn't revalidate it against the
+    # response_model, which is kept for the docs
+    return ORJSONResponse(response.model_dump(mode="json"))
+
 
+async def _get_count(
+    session: AsyncSession, filters: ListingGetRequest, property_filters: list
+) -> int:
+    count_statement = _add_property_filters(_BASE_COUNT_STATEMENT, property_filters)
     count_statement = _add_filters(count_statement, filters)
 
-    result = session.exec(count_statement)
-    total_count = result.one() if result is not None else 0
+    return (await session.exec(count_statement)).one()
 
-    return total_count
+
+def _get_entities_filter(dataset_entities: str):
+    """Match listings having at least one entity whose data contains the filter."""
+    return exists().where(
+        DatasetEntity.entity_id == any_(Listing.dataset_entity_ids),
+        DatasetEntity.data.op("@>")(orjson.loads(dataset_entities)),
+    )
 
 
 def _add_property_filters(statement: Select, property_filters: list) -> Select:
@@ -149,89 +158,56 @@ def _add_property_filters(statement: Select, property_filters: list) -> Select:
     return statement
 
 
-def _get_property_filtered_ids(
-    properties: str, session: Session, listing_id_filter: str | None = None
-) -> tuple[bool, list[str]]:
+async def _get_property_filters(properties: str | None, session: AsyncSession) -> list:
     """
-    Returns a tuple of (has_property_filters, listing_ids)
+    Returns one correlated EXISTS clause per property filter, each one probing
+    the value table that matches the property's type.
     """
-
-    def _get_property_type(property_id: int) -> str:
-        return session.exec(
-            select(Property.type).where(Property.property_id == property_id)
-        ).one()
-
-    properties = json.loads(properties) if properties else {}
+    properties = orjson.loads(properties) if properties else {}
 
     if not properties:
-        return False, []
+        return []
 
-    # Create a {"string": [...], "boolean": [...]} map
-    type_filter_map = defaultdict(list)
-    for property_id, expected_value in properties.items():
-        property_id = int(property_id)
-        property_type = _get_property_type(property_id)
-        type_filter_map[property_type].append(
-            {
-                "property_id": property_id,
-                "value": expected_value,
-            }
-        )
+    properties = {
+        int(property_id): expected_value
+        for property_id, expected_value in properties.items()
+    }
+    # One array parameter, the same statement for any number of filters
+    statement = select(Property.property_id, Property.type).where(
+        Property.property_id == any_(literal(list(properties), ARRAY(Integer)))
+    )
+    property_types = dict((await session.exec(statement)).all())
 
-    listing_ids = []
-    for property_type, filters in type_filter_map.items():
-        listing_ids.extend(
-            _get_listing_ids_for_property_type(
-                property_type, filters, session, listing_id_filter
+    property_filters = []
+    for property_id, expected_value in properties.items():
+        property_type = property_types.get(property_id)
+
+        if property_type == PropertyType.BOOLEAN:
+            VALUE_TABLE = BooleanPropertyValue
+            if is_bool_like(expected_value):
+                expected_value = _BOOL_ADAPTER.validate_python(expected_value)
+            value_conditions = [VALUE_TABLE.value == expected_value]
+        elif property_type == PropertyType.STRING:
+            VALUE_TABLE = StringPropertyValue
+            # Probe the md5(value) index, then compare the value itself
+            value_conditions = [
+                func.md5(VALUE_TABLE.value) == func.md5(cast(expected_value, String)),
+                VALUE_TABLE.value == expected_value,
+            ]
+        else:
+            # Unknown property, no listing can match it
+            property_filters.append(false())
+            continue
+
+        property_filters.append(
+            exists().where(
+                VALUE_TABLE.listing_id == Listing.listing_id,
+                VALUE_TABLE.property_id == property_id,
+                *value_conditions,
             )
         )
 
-    return True, listing_ids
-
-
-def _get_listing_ids_for_property_type(
-    property_type: str,
-    filters: list[dict],
-    session: Session,
-    listing_id_filter: str | None = None,
-) -> list[str]:
-    if property_type == PropertyType.BOOLEAN:
-        prop_filter_query = select(BooleanPropertyValue.listing_id)
-        for filter in filters:
-            bool_value = (
-                TypeAdapter(bool).validate_python(filter["value"])
-                if is_bool_like(filter["value"])
-                else filter["value"]
-            )
-            prop_filter_query = prop_filter_query.where(
-                BooleanPropertyValue.property_id == filter["property_id"],
-                BooleanPropertyValue.value == bool_value,
-            )
-
-        if listing_id_filter:
-            prop_filter_query = prop_filter_query.where(
-                BooleanPropertyValue.listing_id == listing_id_filter
-            )
-
-        prop_filter_query = prop_filter_query.group_by(BooleanPropertyValue.listing_id)
-        return session.exec(prop_filter_query).all()
-    elif property_type == PropertyType.STRING:
-        prop_filter_query = select(StringPropertyValue.listing_id)
-        for filter in filters:
-            prop_filter_query = prop_filter_query.where(
-                StringPropertyValue.property_id == filter["property_id"],
-                StringPropertyValue.value == filter["value"],
-            )
-
-        if listing_id_filter:
-            prop_filter_query = prop_filter_query.where(
-                StringPropertyValue.listing_id == listing_id_filter
-            )
-
-        prop_filter_query = prop_filter_query.group_by(StringPropertyValue.listing_id)
-        return session.exec(prop_filter_query).all()
-    else:
-        raise ValueError(f"Invalid property type: {property_type}")
+    return property_filters
 
 
 def _add_filters(statement: Select, filters: ListingGetRequest):
@@ -251,40 +227,62 @@ def _add_filters(statement: Select, filters: ListingGetRequest):
     if filters.image_hashes:
         statement = statement.where(Listing.image_hashes.op("&&")(filters.image_hashes))
 
+    if filters.dataset_entities:
+        statement = statement.where(_get_entities_filter(filters.dataset_entities))
+
     return statement
 
 
+async def _get_entities(
+    listings: list[Listing], session: AsyncSession
+) -> dict[int, ListingGetEntity]:
+    # Load the entities of the listings in one query as plain columns, they
+    # go straight into the response models without hydrating ORM instances
+    entity_ids = {
+        entity_id for listing in listings for entity_id in listing.dataset_entity_ids
+    }
+    if not entity_ids:
+        return {}
+
+    statement = select(
+        DatasetEntity.entity_id, DatasetEntity.name, DatasetEntity.data
+    ).where(DatasetEntity.entity_id == any_(literal(list(entity_ids), ARRAY(Integer))))
+    return {
+        entity_id: ListingGetEntity.model_construct(name=name, data=data)
+        for entity_id, name, data in await session.exec(statement)
+    }
+
+
 def _get_formatted_results(
-    results: list[tuple[Listing, list[dict]]],
+    listings: list[Listing], entities: dict[int, ListingGetEntity]
 ) -> list[ListingGet]:
+    # The rows come straight from the database, so skip pydantic validation
     formatted_results = []
-    for result in results:
-        listing, entities = result
+    for listing in listings:
         str_properties = listing.string_property_values
         bool_properties = listing.boolean_property_values
 
-        properties = []
-        for property in str_properties + bool_properties:
-            properties.append(
-                {
-                    "name": property.property.name,
-                    "type": "str"
-                    if property.property.type == PropertyType.STRING
-                    else "bool",
-                    "value": property.value,
-                }
+        properties = [
+            ListingGetProperty.model_construct(
+                name=property.property.name,
+                type="str" if property.property.type == PropertyType.STRING else "bool",
+                value=property.value,
             )
+            for property in chain(str_properties, bool_properties)
+        ]
 
         formatted_results.append(
-            ListingGet(
+            ListingGet.model_construct(
                 listing_id=listing.listing_id,
-                scan_date=listing.scan_date.isoformat(sep=" ")
-                if listing.scan_date
-                else "",
+                scan_date=listing.scan_date,
                 is_active=listing.is_active,
                 image_hashes=listing.image_hashes,
                 properties=properties,
-                entities=entities,
+                entities=[
+                    entities[entity_id]
+                    for entity_id in listing.dataset_entity_ids
+                    if entity_id in entities
+                ],
             )
         )
 
@@ -292,152 +290,183 @@ def _get_formatted_results(
 
 
 @router.put("/", response_model=UpsertListingsResponse)
-def upsert_listings(listings_data: UpsertListingsRequest):
+async def upsert_listings(
+    listings_data: UpsertListingsRequest,
+    session: Annotated[AsyncSession, Depends(get_async_session)],
+):
     """
     Insert or update multiple listings with their properties and entities.
     `UpsertListingsRequest` is the source of truth.
     """
-    logger.info(f"PUT /listings/ - Upserting {len(listings_data.listings)} listings")
-
-    with get_db_session() as session:
-        listings = listings_data.listings
-        current_listing_index = ""
-
-        try:
-            for index, listing_data in enumerate(listings):
-                current_listing_index = listing_data.listing_id
+    logger.info("PUT /listings/ - Upserting %d listings", len(listings_data.listings))
 
-                listing_obj = _upsert_listing(listing_data, session)
+    listings = listings_data.listings
 
-                _upsert_properties(
-                    properties=listing_data.properties,
-                    session=session,
-                    listing_id=listing_data.listing_id,
-                )
-
-                entity_ids = _upsert_entities(
-                    entities=listing_data.entities,
-                    session=session,
-                    listing_id=listing_data.listing_id,
-                )
+    try:
+        if not listings:
+            return UpsertListingsResponse(status="success", error=None)
 
-                # Update listing with entity IDs
-                listing_obj.dataset_entity_ids = entity_ids
+        # Entities and properties first, their IDs are needed below
+        entity_ids = await _upsert_entities(listings=listings, session=session)
+        property_ids = await _upsert_properties(listings=listings, session=session)
 
-            return UpsertListingsResponse(status="success", error=None)
-        except Exception as e:
-            session.rollback()
-            return UpsertListingsResponse(
-                status="failed",
-                error={"listing_id": current_listing_index, "error": str(e)},
+        # No rows come back, so psycopg's pipeline sends these together
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        async with raw_connection.driver_connection.pipeline():
+            await _upsert_listings(
+                listings=listings, session=session, entity_ids=entity_ids
+            )
+            await _upsert_property_values(
+                listings=listings, session=session, property_ids=property_ids
             )
 
-
-def _upsert_listing(listing_data: UpsertListing, session: Session) -> Listing:
-    existing_listing = session.exec(
-        select(Listing).where(Listing.listing_id == listing_data.listing_id)
-    ).first()
-
-    if existing_listing:
-        # Update existing listing
-        existing_listing.scan_date = listing_data.scan_date
-        existing_listing.is_active = listing_data.is_active
-        existing_listing.image_hashes = listing_data.image_hashes
-        existing_listing.dataset_entity_ids = []  # Will be populated from entities
-        session.add(existing_listing)
-
-        listing_obj = existing_listing
-    else:
-        # Create new listing
-        new_listing = Listing(
-            listing_id=listing_data.listing_id,
-            scan_date=listing_data.scan_date,
-            is_active=listing_data.is_active,
-            image_hashes=listing_data.image_hashes,
-            dataset_entity_ids=[],
+        return UpsertListingsResponse(status="success", error=None)
+    except Exception as e:
+        await session.rollback()
+        return UpsertListingsResponse(
+            status="failed",
+            error={"listing_id": None, "error": str(e)},
         )
-        session.add(new_listing)
-        listing_obj = new_listing
-
-    return listing_obj
 
 
-def _upsert_properties(properties: list[Property], session: Session, listing_id: str):
-    """Upsert properties for a listing."""
-    property_table_map = {
-        "str": StringPropertyValue,
-        "string": StringPropertyValue,
-        "bool": BooleanPropertyValue,
-        "boolean": BooleanPropertyValue,
+async def _upsert_listings(
+    listings: list[UpsertListing], session: AsyncSession, entity_ids: dict[str, int]
+):
+    """Upsert all listings in one executemany, keyed by listing_id."""
+    values = {
+        listing_data.listing_id: {
+            "listing_id": listing_data.listing_id,
+            "scan_date": listing_data.scan_date,
+            "is_active": listing_data.is_active,
+            "image_hashes": listing_data.image_hashes,
+            "dataset_entity_ids": [
+                entity_ids[entity_data.name] for entity_data in listing_data.entities
+            ],
+        }
+        for listing_data in listings
     }
 
-    formatter = {
-        StringPropertyValue: lambda x: x.value,
-        BooleanPropertyValue: lambda x: x.value.lower() == "true",
-    }
-
-    for property_data in properties:
-        # Find or create Property record
-        property_type = property_data.type.lower()
-        property_record = session.exec(
-            select(Property).where(Property.name == property_data.name)
-        ).first()
-
-        if not property_record:
-            is_str_property = property_type in ["str", "string"]
-            property_record = Property(
-                name=property_data.name,
-                type=PropertyType.STRING if is_str_property else PropertyType.BOOLEAN,
-            )
-            session.add(property_record)
-            session.flush()  # Get the property_id
+    insert_statement = pg_insert(Listing)
+    await session.exec(
+        insert_statement.on_conflict_do_update(
+            index_elements=["listing_id"],
+            set_={
+                "scan_date": insert_statement.excluded.scan_date,
+                "is_active": insert_statement.excluded.is_active,
+                "image_hashes": insert_statement.excluded.image_hashes,
+                "dataset_entity_ids": insert_statement.excluded.dataset_entity_ids,
+            },
+        ),
+        params=list(values.values()),
+    )
 
-        # Property Table. Eg. StringPropertyValue / BooleanPropertyValue
-        VALUE_TABLE: type[PropertyValueLike] = property_table_map[property_type]
 
-        existing_value = session.exec(
-            select(VALUE_TABLE).where(
-                VALUE_TABLE.listing_id == listing_id,
-                VALUE_TABLE.property_id == property_record.property_id,
-            )
-        ).first()
+async def _upsert_properties(
+    listings: list[UpsertListing], session: AsyncSession
+) -> dict[str, int]:
+    """Find or create the properties of all listings, returns their IDs by name."""
+    names = {
+        property_data.name
+        for listing_data in listings
+        for property_data in listing_data.properties
+    }
+    if not names:
+        return {}
+
+    # Find all Property records in one round trip
+    property_ids = await _get_property_ids(names, session)
+
+    # Create the missing ones, skipping properties created concurrently,
+    # then read back the IDs of all of them
+    missing_properties = {
+        property_data.name: property_data
+        for listing_data in listings
+        for property_data in listing_data.properties
+        if property_data.name not in property_ids
+    }
+    if missing_properties:
+        await session.exec(
+            pg_insert(Property).on_conflict_do_nothing(index_elements=["name"]),
+            params=[
+                {"name": property_data.name, "type": property_data.type}
+                for property_data in missing_properties.values()
+            ],
+        )
+        property_ids.update(await _get_property_ids(missing_properties, session))
 
-        # Format the value to the correct type
-        value = formatter[VALUE_TABLE](property_data)
+    return property_ids
 
-        # Upsert the value
-        if existing_value:
-            existing_value.value = value
-            session.add(existing_value)
-        else:
-            property_value = VALUE_TABLE(
-                listing_id=listing_id,
-                property_id=property_record.property_id,
-                value=value,
-            )
-            session.add(property_value)
 
+async def _get_property_ids(
+    names: Iterable[str], session: AsyncSession
+) -> dict[str, int]:
+    # A single array parameter keeps the statement the same for any number
+    # of names, so its prepared statement is reused
+    statement = select(Property.name, Property.property_id).where(
+        Property.name == any_(literal(list(names), ARRAY(String)))
+    )
+    return dict((await session.exec(statement)).all())
+
+
+async def _upsert_property_values(
+    listings: list[UpsertListing], session: AsyncSession, property_ids: dict[str, int]
+):
+    """Upsert the property values of all listings."""
+    # Group the values per table, keyed by (listing_id, property_id) so a
+    # property repeated on a listing is written once with its last value
+    values_by_table = defaultdict(dict)
+    for listing_data in listings:
+        for property_data in listing_data.properties:
+            # Property Table. Eg. StringPropertyValue / BooleanPropertyValue
+            VALUE_TABLE: type[PropertyValueLike] = _PROPERTY_TABLE_MAP[
+                property_data.type
+            ]
+            property_id = property_ids[property_data.name]
+
+            values_by_table[VALUE_TABLE][(listing_data.listing_id, property_id)] = {
+                "listing_id": listing_data.listing_id,
+                "property_id": property_id,
+                # Format the value to the correct type
+                "value": _FORMATTER[VALUE_TABLE](property_data),
+            }
 
-def _upsert_entities(
-    entities: list[Entity], session: Session, listing_id: str
-) -> list[int]:
-    entity_ids = []
+    # Upsert the values, one executemany per table
+    for VALUE_TABLE, values in values_by_table.items():
+        insert_statement = pg_insert(VALUE_TABLE)
+        await session.exec(
+            insert_statement.on_conflict_do_update(
+                index_elements=["listing_id", "property_id"],
+                set_={"value": insert_statement.excluded.value},
+            ),
+            params=list(values.values()),
+        )
 
-    for entity_data in entities:
-        # Find or create DatasetEntity
-        entity_record = session.exec(
-            select(DatasetEntity).where(DatasetEntity.name == entity_data.name)
-        ).first()
 
-        if not entity_record:
-            entity_record = DatasetEntity(name=entity_data.name, data=entity_data.data)
-            session.add(entity_record)
-            session.flush()  # Get the entity_id
-        else:
-            # Update existing entity data
-            entity_record.data = entity_data.data
-            session.add(entity_record)
-
-        entity_ids.append(entity_record.entity_id)
+async def _upsert_entities(
+    listings: list[UpsertListing], session: AsyncSession
+) -> dict[str, int]:
+    """Upsert the entities of all listings, returns their IDs by name."""
+    # Keyed by name, an entity repeated in the batch is written once with
+    # its last data
+    values = {
+        entity_data.name: {"name": entity_data.name, "data": entity_data.data}
+        for listing_data in listings
+        for entity_data in listing_data.entities
+    }
+    if not values:
+        return {}
+
+    insert_statement = pg_insert(DatasetEntity)
+    await session.exec(
+        insert_statement.on_conflict_do_update(
+            index_elements=["name"],
+            set_={"data": insert_statement.excluded.data},
+        ),
+        params=list(values.values()),
+    )
 
-    return entity_ids
+    statement = select(DatasetEntity.name, DatasetEntity.entity_id).where(
+        DatasetEntity.name == any_(literal(list(values), ARRAY(String)))
+    )
+    return dict((await session.exec(statement)).all())
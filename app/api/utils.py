@@ -1,16 +1,17 @@
-BOOL_LIKE_VALUES = [
-    "true",
-    "True",
-    "1",
-    "on",
-    "yes",
-    "false",
-    "False",
-    "0",
-    "off",
-    "no",
-]
+import base64
+
+BOOL_LIKE_VALUES = frozenset({"true", "1", "on", "yes", "false", "0", "off", "no"})
 
 
 def is_bool_like(value: str) -> bool:
-    return value in BOOL_LIKE_VALUES
+    return isinstance(value, str) and value.lower() in BOOL_LIKE_VALUES
+
+
+def encode_cursor(listing_id: str) -> str:
+    return base64.urlsafe_b64encode(listing_id.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> str:
+    # validate=True rejects characters outside the urlsafe alphabet instead
+    # of silently dropping them
+    return base64.b64decode(cursor, altchars=b"-_", validate=True).decode()
@@ -1,19 +1,22 @@
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 
 from app.api.listings import router as listings_router
-from app.database import initialize_database
+from app.database import close_database, initialize_database, warm_database_pool
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize the database on startup."""
+    """Initialize the database on startup and release the pool on shutdown."""
     await initialize_database()
+    await warm_database_pool()
     yield
+    await close_database()
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Include routers
 app.include_router(listings_router)
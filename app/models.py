@@ -2,13 +2,17 @@ import enum
 from datetime import datetime
 from typing import Dict, List, Optional
 
-from sqlalchemy import Integer, String
+from sqlalchemy import Index, Integer, String, func, text
 from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlmodel import Column, Enum, Field, Relationship, SQLModel
 
 
 class Listing(SQLModel, table=True):
     __tablename__ = "test_listings"
+    __table_args__ = (
+        # Serves the image_hashes overlap filter (`&&`)
+        Index("ix_listing_image_hashes_gin", "image_hashes", postgresql_using="gin"),
+    )
 
     listing_id: str = Field(default=None, primary_key=True)
     scan_date: datetime
@@ -24,11 +28,6 @@ class Listing(SQLModel, table=True):
         back_populates="listing"
     )
 
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.strftime("%Y-%m-%d %H:%M:%S"),
-        }
-
 
 class PropertyType(enum.Enum):
     STRING = "string"
@@ -39,7 +38,7 @@ class Property(SQLModel, table=True):
     __tablename__ = "test_properties"
 
     property_id: int = Field(default=None, primary_key=True)
-    name: str
+    name: str = Field(nullable=False, unique=True)
     type: PropertyType = Field(
         sa_column=Column(
             Enum(PropertyType),
@@ -58,12 +57,21 @@ class Property(SQLModel, table=True):
 
 class StringPropertyValue(SQLModel, table=True):
     __tablename__ = "test_property_values_str"
-
-    listing_id: str = Field(
-        foreign_key="test_listings.listing_id", primary_key=True, index=True
+    __table_args__ = (
+        # Serves the property filter EXISTS, the (listing_id, property_id)
+        # primary key serves the listing side. Values are unbounded, so index
+        # their md5 to stay under the btree row size limit.
+        Index(
+            "ix_spv_pid_md5val_lid",
+            "property_id",
+            func.md5(text("value")),
+            "listing_id",
+        ),
     )
+
+    listing_id: str = Field(foreign_key="test_listings.listing_id", primary_key=True)
     property_id: int = Field(
-        foreign_key="test_properties.property_id", primary_key=True, index=True
+        foreign_key="test_properties.property_id", primary_key=True
     )
     value: str
 
@@ -74,12 +82,15 @@ class StringPropertyValue(SQLModel, table=True):
 
 class BooleanPropertyValue(SQLModel, table=True):
     __tablename__ = "test_property_values_bool"
-
-    listing_id: str = Field(
-        foreign_key="test_listings.listing_id", primary_key=True, index=True
+    __table_args__ = (
+        # Covers the property filter EXISTS with an index-only scan, the
+        # (listing_id, property_id) primary key serves the listing side
+        Index("ix_bpv_pid_val_lid", "property_id", "value", "listing_id"),
     )
+
+    listing_id: str = Field(foreign_key="test_listings.listing_id", primary_key=True)
     property_id: int = Field(
-        foreign_key="test_properties.property_id", primary_key=True, index=True
+        foreign_key="test_properties.property_id", primary_key=True
     )
     value: bool
 
@@ -92,6 +103,15 @@ class BooleanPropertyValue(SQLModel, table=True):
 
 class DatasetEntity(SQLModel, table=True):
     __tablename__ = "test_dataset_entities"
+    __table_args__ = (
+        # jsonb_path_ops only supports `@>`, which is all the entity filter uses
+        Index(
+            "ix_de_data_gin",
+            "data",
+            postgresql_using="gin",
+            postgresql_ops={"data": "jsonb_path_ops"},
+        ),
+    )
 
     entity_id: int = Field(nullable=False, primary_key=True)
     name: str = Field(nullable=False, unique=True)
@@ -1,13 +1,27 @@
 from datetime import datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
+
+from app.api.utils import decode_cursor
+from app.models import PropertyType
+
+PROPERTY_TYPE_ALIASES = {"str": PropertyType.STRING, "bool": PropertyType.BOOLEAN}
 
 
 class Property(BaseModel):
     name: str
-    type: str
+    type: PropertyType
     value: str
 
+    @field_validator("type", mode="before")
+    @classmethod
+    def normalize_type(cls, type: str) -> str | PropertyType:
+        # Accept the short "str"/"bool" spellings used by clients
+        if isinstance(type, str):
+            type = type.lower()
+            return PROPERTY_TYPE_ALIASES.get(type, type)
+        return type
+
 
 class Entity(BaseModel):
     name: str
@@ -28,7 +42,8 @@ class UpsertListingsRequest(BaseModel):
 
 
 class ListingGetRequest(BaseModel):
-    page: int | None = 1
+    cursor: str | None = None
+    include_total: bool = False
     listing_id: str | None = None
     scan_date_from: datetime | None = None
     scan_date_to: datetime | None = None
@@ -36,3 +51,13 @@ class ListingGetRequest(BaseModel):
     image_hashes: list[str] | None = None
     dataset_entities: str | None = None
     properties: str | None = None
+
+    @field_validator("cursor")
+    @classmethod
+    def validate_cursor(cls, cursor: str | None) -> str | None:
+        if cursor is not None:
+            try:
+                decode_cursor(cursor)
+            except ValueError:
+                raise ValueError("Invalid cursor")
+        return cursor
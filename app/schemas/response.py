@@ -1,10 +1,11 @@
+from datetime import datetime
 from typing import Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, field_serializer
 
 
 class UpsertListingsError(BaseModel):
-    listing_id: str
+    listing_id: str | None = None
     error: str
 
 
@@ -26,13 +27,18 @@ class ListingGetEntity(BaseModel):
 
 class ListingGet(BaseModel):
     listing_id: str
-    scan_date: str
+    scan_date: datetime
     is_active: bool
     image_hashes: list[str]
     properties: list[ListingGetProperty]
     entities: list[ListingGetEntity]
 
+    @field_serializer("scan_date")
+    def serialize_scan_date(self, scan_date: datetime) -> str:
+        return scan_date.isoformat(sep=" ")
+
 
 class ListingsGetResponse(BaseModel):
     listings: list[ListingGet]
-    total: int
+    total: int | None
+    next_cursor: str | None
@@ -2,35 +2,48 @@ import logging
 from datetime import datetime
 
 import pytest
+from fastapi.testclient import TestClient
 from sqlalchemy import text
-from sqlmodel import SQLModel
+from sqlmodel import Session, SQLModel, create_engine
 
-from app.database import get_db_session
+from app.database import get_database_url
+from app.main import app
 from app.schemas.request import Entity, Property, UpsertListing, UpsertListingsRequest
 
 logger = logging.getLogger(__name__)
 
 
+@pytest.fixture
+def db_session():
+    """Provide a synchronous session for test setup and assertions."""
+    engine = create_engine(get_database_url())
+    try:
+        with Session(engine) as session:
+            yield session
+    finally:
+        engine.dispose()
+
+
 @pytest.fixture(autouse=True)
-def cleanup_test_database():
+def cleanup_test_database(db_session):
     """Cleanup test database after each test."""
     yield
 
     try:
-        with get_db_session() as session:
-            for table in reversed(list(SQLModel.metadata.tables.values())):
-                session.exec(text(f"TRUNCATE TABLE {table.name} CASCADE"))
-            session.commit()
+        # One statement for all tables instead of a round trip per table
+        table_names = ", ".join(
+            table.name for table in reversed(SQLModel.metadata.sorted_tables)
+        )
+        db_session.exec(text(f"TRUNCATE TABLE {table_names} RESTART IDENTITY CASCADE"))
+        db_session.commit()
     except Exception as e:
         logger.error(f"Failed to cleanup test database: {e}")
-        session.rollback()
+        db_session.rollback()
 
 
 @pytest.fixture
 def create_sample_listings():
     """Provide sample listings for testing."""
-    from app.api.listings import upsert_listings
-
     listings = UpsertListingsRequest(
         listings=[
             UpsertListing(
@@ -92,8 +105,11 @@ def create_sample_listings():
         ],
     )
 
-    response = upsert_listings(listings)
-    if response.status == "failed":
-        raise Exception(f"Failed to create sample listings: {response.error}")
+    with TestClient(app) as client:
+        response = client.put("/listings/", json=listings.model_dump(mode="json"))
+
+    data = response.json()
+    if data["status"] == "failed":
+        raise Exception(f"Failed to create sample listings: {data['error']}")
 
     return listings
@@ -4,7 +4,7 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import select
 
-from app.database import get_db_session
+from app.api.utils import encode_cursor
 from app.main import app
 from app.models import Property
 
@@ -13,7 +13,7 @@ from app.models import Property
 def test_get_listings_endpoint(create_sample_listings, cleanup_test_database):
     """Integration test for GET /listings endpoint."""
     with TestClient(app) as client:
-        response = client.get("/listings/")
+        response = client.get("/listings/?include_total=true")
 
         assert response.status_code == 200
 
@@ -42,7 +42,7 @@ def test_get_listings_endpoint(create_sample_listings, cleanup_test_database):
 def test_get_listings_with_listing_id(create_sample_listings, cleanup_test_database):
     """Integration test for GET /listings endpoint."""
     with TestClient(app) as client:
-        response = client.get("listings/?listing_id=112")
+        response = client.get("listings/?listing_id=112&include_total=true")
 
         assert response.status_code == 200
 
@@ -63,6 +63,7 @@ def test_get_listings_with_from_to_dates(create_sample_listings, cleanup_test_da
     with TestClient(app) as client:
         response = client.get(
             "listings/?scan_date_from=2020-06-10&scan_date_to=2025-01-01"
+            "&include_total=true"
         )
 
         assert response.status_code == 200
@@ -78,7 +79,7 @@ def test_get_listings_with_from_to_dates(create_sample_listings, cleanup_test_da
 def test_get_listings_with_from_date(create_sample_listings, cleanup_test_database):
     """Integration test for GET /listings endpoint."""
     with TestClient(app) as client:
-        response = client.get("listings/?scan_date_from=2020-06-10")
+        response = client.get("listings/?scan_date_from=2020-06-10&include_total=true")
 
         assert response.status_code == 200
 
@@ -93,7 +94,9 @@ def test_get_listings_with_from_date(create_sample_listings, cleanup_test_databa
 def test_get_listings_with_image_hashes(create_sample_listings, cleanup_test_database):
     """Integration test for GET /listings endpoint."""
     with TestClient(app) as client:
-        response = client.get("listings/?image_hashes=hash1&image_hashes=hash2")
+        response = client.get(
+            "listings/?image_hashes=hash1&image_hashes=hash2&include_total=true"
+        )
 
         assert response.status_code == 200
 
@@ -110,7 +113,9 @@ def test_get_listings_with_dataset_entities(
 ):
     """Integration test for GET /listings endpoint."""
     with TestClient(app) as client:
-        response = client.get('listings/?dataset_entities={"key1": "value1"}')
+        response = client.get(
+            'listings/?dataset_entities={"key1": "value1"}&include_total=true'
+        )
 
         assert response.status_code == 200
         data = response.json()
@@ -119,7 +124,9 @@ def test_get_listings_with_dataset_entities(
         assert data["total"] == 2
         assert len(listings) == 2
 
-        response = client.get('listings/?dataset_entities={"key3": "value3"}')
+        response = client.get(
+            'listings/?dataset_entities={"key3": "value3"}&include_total=true'
+        )
 
         data = response.json()
         listings = data["listings"]
@@ -129,18 +136,87 @@ def test_get_listings_with_dataset_entities(
 
 
 @pytest.mark.integration
-def test_get_listings_with_properties(create_sample_listings, cleanup_test_database):
+def test_get_listings_without_entities(cleanup_test_database):
     """Integration test for GET /listings endpoint."""
     with TestClient(app) as client:
-        property_id = 1
-        with get_db_session() as session:
-            property_id = session.exec(
-                select(Property.property_id).where(Property.name == "Has Delivery")
-            ).first()
+        response = client.put(
+            "/listings/",
+            json={
+                "listings": [
+                    {
+                        "listing_id": "115",
+                        "scan_date": "2025-01-05 15:30:50",
+                        "is_active": "true",
+                        "image_hashes": [],
+                        "properties": [],
+                        "entities": [],
+                    }
+                ]
+            },
+        )
+        assert response.json()["status"] == "success"
 
-        response = client.get(
-            f"listings/?properties={json.dumps({property_id: 'false'})}"
+        response = client.get("listings/?include_total=true")
+
+        assert response.status_code == 200
+        data = response.json()
+        listings = data["listings"]
+
+        assert data["total"] == 1
+        assert listings[0]["listing_id"] == "115"
+        assert listings[0]["entities"] == []
+
+
+@pytest.mark.integration
+def test_get_listings_with_dataset_entities_returns_all_entities(
+    cleanup_test_database,
+):
+    """Integration test for GET /listings endpoint."""
+    with TestClient(app) as client:
+        response = client.put(
+            "/listings/",
+            json={
+                "listings": [
+                    {
+                        "listing_id": "116",
+                        "scan_date": "2025-01-05 15:30:50",
+                        "is_active": "true",
+                        "image_hashes": [],
+                        "properties": [],
+                        "entities": [
+                            {"name": "entity_one", "data": {"key1": "value1"}},
+                            {"name": "entity_two", "data": {"key3": "value3"}},
+                        ],
+                    }
+                ]
+            },
         )
+        assert response.json()["status"] == "success"
+
+        response = client.get('listings/?dataset_entities={"key3": "value3"}')
+
+        assert response.status_code == 200
+        listings = response.json()["listings"]
+
+        assert len(listings) == 1
+        assert listings[0]["entities"] == [
+            {"name": "entity_one", "data": {"key1": "value1"}},
+            {"name": "entity_two", "data": {"key3": "value3"}},
+        ]
+
+
+@pytest.mark.integration
+def test_get_listings_with_properties(
+    create_sample_listings, cleanup_test_database, db_session
+):
+    """Integration test for GET /listings endpoint."""
+    with TestClient(app) as client:
+        property_id = db_session.exec(
+            select(Property.property_id).where(Property.name == "Has Delivery")
+        ).first()
+
+        properties = json.dumps({property_id: "false"})
+        response = client.get(f"listings/?properties={properties}&include_total=true")
 
         assert response.status_code == 200
         data = response.json()
@@ -151,10 +227,93 @@ def test_get_listings_with_properties(create_sample_listings, cleanup_test_datab
 
 
 @pytest.mark.integration
-def test_get_listings_empty_response():
+def test_get_listings_with_multiple_properties(
+    create_sample_listings, cleanup_test_database, db_session
+):
+    """Integration test for GET /listings endpoint."""
+    with TestClient(app) as client:
+        property_ids = dict(
+            db_session.exec(select(Property.name, Property.property_id)).all()
+        )
+
+        properties = json.dumps(
+            {property_ids["Brand"]: "Apple", property_ids["Has Delivery"]: "true"}
+        )
+        response = client.get(f"listings/?properties={properties}&include_total=true")
+
+        assert response.status_code == 200
+        data = response.json()
+        listings = data["listings"]
+
+        assert data["total"] == 1
+        assert [listing["listing_id"] for listing in listings] == ["113"]
+
+        properties = json.dumps(
+            {property_ids["Brand"]: "Samsung", property_ids["Has Delivery"]: "true"}
+        )
+        response = client.get(f"listings/?properties={properties}&include_total=true")
+
+        data = response.json()
+
+        assert data["total"] == 0
+        assert len(data["listings"]) == 0
+
+
+@pytest.mark.integration
+def test_get_listings_with_unknown_property(
+    create_sample_listings, cleanup_test_database, db_session
+):
+    """Integration test for GET /listings endpoint."""
+    with TestClient(app) as client:
+        property_ids = db_session.exec(select(Property.property_id)).all()
+
+        properties = json.dumps({max(property_ids) + 1: "Samsung"})
+        response = client.get(f"listings/?properties={properties}&include_total=true")
+
+        assert response.status_code == 200
+        data = response.json()
+
+        assert data["total"] == 0
+        assert len(data["listings"]) == 0
+
+
+@pytest.mark.integration
+def test_get_listings_with_cursor(create_sample_listings, cleanup_test_database):
+    """Integration test for GET /listings endpoint."""
     with TestClient(app) as client:
         response = client.get("/listings/")
 
+        assert response.status_code == 200
+
+        data = response.json()
+        assert data["total"] is None
+        assert data["next_cursor"] is None
+
+        cursor = encode_cursor("112")
+        response = client.get(f"/listings/?cursor={cursor}")
+
+        assert response.status_code == 200
+
+        data = response.json()
+        listings = data["listings"]
+
+        assert [listing["listing_id"] for listing in listings] == ["113", "114"]
+
+
+@pytest.mark.integration
+def test_get_listings_with_invalid_cursor():
+    """Integration test for GET /listings endpoint."""
+    with TestClient(app) as client:
+        response = client.get("/listings/?cursor=!!!")
+
+        assert response.status_code == 422
+
+
+@pytest.mark.integration
+def test_get_listings_empty_response():
+    with TestClient(app) as client:
+        response = client.get("/listings/?include_total=true")
+
         assert response.status_code == 200
         data = response.json()
         assert data["total"] == 0
@@ -208,3 +367,150 @@ def test_put_listings_endpoint(cleanup_test_database):
         )
         assert bool_property["name"] == "Has Delivery"
         assert bool_property["value"] is False
+
+
+@pytest.mark.integration
+def test_put_listings_with_long_string_value(cleanup_test_database, db_session):
+    """Integration test for PUT /listings endpoint."""
+    long_value = "x" * 10_000
+
+    with TestClient(app) as client:
+        response = client.put(
+            "/listings/",
+            json={
+                "listings": [
+                    {
+                        "listing_id": "112",
+                        "scan_date": "2025-01-05 15:30:50",
+                        "is_active": "true",
+                        "image_hashes": [],
+                        "properties": [
+                            {"name": "Description", "type": "str", "value": long_value}
+                        ],
+                        "entities": [],
+                    }
+                ]
+            },
+        )
+
+        assert response.status_code == 200
+        assert response.json()["status"] == "success"
+
+        property_id = db_session.exec(
+            select(Property.property_id).where(Property.name == "Description")
+        ).first()
+
+        properties = json.dumps({property_id: long_value})
+        response = client.get(f"listings/?properties={properties}")
+
+        listings = response.json()["listings"]
+        assert [listing["listing_id"] for listing in listings] == ["112"]
+
+
+@pytest.mark.integration
+def test_put_listings_updates_existing_listing(
+    create_sample_listings, cleanup_test_database
+):
+    """Integration test for PUT /listings endpoint."""
+    with TestClient(app) as client:
+        response = client.put(
+            "/listings/",
+            json={
+                "listings": [
+                    {
+                        "listing_id": "112",
+                        "scan_date": "2025-01-05 15:30:50",
+                        "is_active": "false",
+                        "image_hashes": ["hash9"],
+                        "properties": [
+                            {"name": "Brand", "type": "str", "value": "LG"},
+                            {"name": "Has Delivery", "type": "bool", "value": "true"},
+                        ],
+                        "entities": [
+                            {"name": "entity_one", "data": {"key1": "changed"}},
+                        ],
+                    }
+                ]
+            },
+        )
+
+        assert response.status_code == 200
+        assert response.json()["status"] == "success"
+
+        response = client.get("listings/?include_total=true")
+        data = response.json()
+        assert data["total"] == 3
+
+        first_listing = data["listings"][0]
+        assert first_listing["listing_id"] == "112"
+        assert first_listing["scan_date"] == "2025-01-05 15:30:50"
+        assert first_listing["is_active"] is False
+        assert first_listing["image_hashes"] == ["hash9"]
+        assert sorted(
+            (prop["name"], prop["value"]) for prop in first_listing["properties"]
+        ) == [("Brand", "LG"), ("Has Delivery", True)]
+        assert first_listing["entities"] == [
+            {"name": "entity_one", "data": {"key1": "changed"}}
+        ]
+
+        # Entities are shared by name, so 114 sees the updated data as well
+        response = client.get('listings/?dataset_entities={"key1": "changed"}')
+        listings = response.json()["listings"]
+        assert [listing["listing_id"] for listing in listings] == ["112", "114"]
+
+
+@pytest.mark.integration
+def test_put_listings_with_repeated_rows(cleanup_test_database):
+    """Integration test for PUT /listings endpoint."""
+    with TestClient(app) as client:
+        response = client.put(
+            "/listings/",
+            json={
+                "listings": [
+                    {
+                        "listing_id": "112",
+                        "scan_date": "2025-01-05 15:30:50",
+                        "is_active": "true",
+                        "image_hashes": ["hash1"],
+                        "properties": [
+                            {"name": "Brand", "type": "str", "value": "Samsung"},
+                        ],
+                        "entities": [
+                            {"name": "entity_one", "data": {"key1": "value1"}},
+                        ],
+                    },
+                    {
+                        "listing_id": "112",
+                        "scan_date": "2025-01-06 10:00:00",
+                        "is_active": "true",
+                        "image_hashes": ["hash2"],
+                        "properties": [
+                            {"name": "Brand", "type": "str", "value": "Apple"},
+                            {"name": "Brand", "type": "str", "value": "Google"},
+                        ],
+                        "entities": [
+                            {"name": "entity_one", "data": {"key1": "value2"}},
+                        ],
+                    },
+                ]
+            },
+        )
+
+        assert response.status_code == 200
+        assert response.json()["status"] == "success"
+
+        response = client.get("listings/?include_total=true")
+        data = response.json()
+        assert data["total"] == 1
+
+        # The last occurrence of each listing, property and entity wins
+        first_listing = data["listings"][0]
+        assert first_listing["listing_id"] == "112"
+        assert first_listing["scan_date"] == "2025-01-06 10:00:00"
+        assert first_listing["image_hashes"] == ["hash2"]
+        assert first_listing["properties"] == [
+            {"name": "Brand", "type": "str", "value": "Google"}
+        ]
+        assert first_listing["entities"] == [
+            {"name": "entity_one", "data": {"key1": "value2"}}
+        ]